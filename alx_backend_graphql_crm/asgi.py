@@ -2,6 +2,8 @@
 ASGI config for alx_backend_graphql_crm project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django; websocket connections to ``/graphql`` serve the
+GraphQL subscriptions.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +15,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from .schema import get_schema  # noqa: E402
+from .websocket import GraphQLWebSocketApp  # noqa: E402
+
+# The schema itself is built on the first websocket subscription, not at boot
+graphql_websocket_application = GraphQLWebSocketApp(get_schema)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket' and scope['path'].rstrip('/') == '/graphql':
+        await graphql_websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -1,6 +1,21 @@
 # alx-backend-graphql_crm/alx-backend-graphql_crm/schema.py
+# Schema registry: the one place the project's GraphQL schema is assembled.
+#
+# The schema is built on first use rather than at import time. App schemas
+# (and the DjangoObjectTypes and FilterSets they define) are imported inside
+# get_schema(), so loading settings, URLs or the ASGI app stays cheap and the
+# cost is paid once per process, on the first GraphQL request.
+
+import re
+from functools import lru_cache
 
 import graphene
+from graphql import OperationType, get_operation_ast, parse, GraphQLError
+
+INTROSPECTION_FIELDS = {'__schema', '__type', '__typename'}
+# Cheap pre-check before parsing: __type always takes a name argument, and
+# neither pattern matches the __typename that clients add to ordinary queries
+INTROSPECTION_HINT = re.compile(r'__schema\b|__type\s*\(')
 
 class Query(graphene.ObjectType):
     """
@@ -8,5 +23,56 @@ class Query(graphene.ObjectType):
     """
     hello = graphene.String(default_value="Hello, GraphQL!")
 
-# The main schema for the project
-schema = graphene.Schema(query=Query)
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_schema():
+    import crm.schema
+
+    class RootQuery(Query, crm.schema.Query, graphene.ObjectType):
+        class Meta:
+            name = 'Query'
+
+    class RootMutation(crm.schema.Mutation, graphene.ObjectType):
+        class Meta:
+            name = 'Mutation'
+
+    class RootSubscription(crm.schema.Subscription, graphene.ObjectType):
+        class Meta:
+            name = 'Subscription'
+
+    return graphene.Schema(query=RootQuery, mutation=RootMutation, subscription=RootSubscription)
+
+@lru_cache(maxsize=None)
+def get_sdl():
+    return str(get_schema())
+
+def is_introspection_query(query, operation_name=None):
+    # Only operations made entirely of __schema/__type/__typename fields, whose
+    # result depends on nothing but the (immutable) schema
+    if not INTROSPECTION_HINT.search(query):
+        return False
+    try:
+        operation = get_operation_ast(parse(query), operation_name)
+    except GraphQLError:
+        return False
+    return (
+        operation is not None
+        and operation.operation == OperationType.QUERY
+        and all(
+            getattr(selection, 'name', None) is not None and selection.name.value in INTROSPECTION_FIELDS
+            for selection in operation.selection_set.selections
+        )
+    )
+
+@lru_cache(maxsize=32)
+def execute_introspection(query, operation_name=None):
+    """
+    Runs an introspection query once and serves the result from memory afterwards.
+    Callers must check is_introspection_query() first.
+    """
+    return get_schema().execute(query, operation_name=operation_name)
+
+def __getattr__(name):
+    # Keeps GRAPHENE["SCHEMA"] = "alx_backend_graphql_crm.schema.schema" working without an eager build
+    if name == 'schema':
+        return get_schema()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -132,5 +132,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Graphene-Django settings
 GRAPHENE = {
-    "SCHEMA": "alx_backend_graphql_crm.schema.schema"
-}
\ No newline at end of file
+    "SCHEMA": "alx_backend_graphql_crm.schema.schema",
+    # Websocket endpoint GraphiQL uses for subscriptions (served by asgi.py)
+    "SUBSCRIPTION_PATH": "/graphql",
+}
+
+# Pub/sub backend feeding the GraphQL subscriptions. The in-process broker only
+# reaches clients connected to the same worker; swap it for a shared backend
+# when running several ASGI workers.
+CRM_PUBSUB_BACKEND = "crm.pubsub.InProcessBroker"
+
+# Number of counter shards each product's stock is split across (see crm/inventory.py).
+# More shards let more concurrent orders for one product proceed without waiting on each other.
+CRM_STOCK_SHARDS = 8
+
+# Product.stock is refreshed from the shards at most once per this many seconds per
+# product and process, so a burst of orders does not rewrite the product row for each one.
+# 0 refreshes on every commit.
+CRM_STOCK_REFRESH_SECONDS = 1.0
+
+# Orders older than this many days are moved to the archive by `manage.py archive_orders`.
+CRM_ORDER_ARCHIVE_DAYS = 365
+
+# How long each process may reuse the archive watermark before reading it again.
+# archive_orders waits this long after raising it, so keep the two in step.
+CRM_ARCHIVE_WATERMARK_SECONDS = 30
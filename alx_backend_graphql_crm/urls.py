@@ -16,8 +16,8 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from .views import CachedIntrospectionGraphQLView, schema_sdl
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,5 +25,6 @@ urlpatterns = [
     # For production, ensure you understand the security implications or handle CSRF appropriately
     # (e.g., if your clients are traditional web browsers submitting forms).
     # For API clients, token-based authentication is more common.
-    path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path("graphql", csrf_exempt(CachedIntrospectionGraphQLView.as_view(graphiql=True))),
+    path("graphql/schema.graphql", schema_sdl),
 ]
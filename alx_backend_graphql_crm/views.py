@@ -0,0 +1,22 @@
+from django.http import HttpResponse
+from graphene_django.views import GraphQLView
+
+from .schema import execute_introspection, get_sdl, is_introspection_query
+
+
+class CachedIntrospectionGraphQLView(GraphQLView):
+    """
+    GraphQLView that answers introspection queries (GraphiQL, codegen and
+    client tooling send them on every load) from an in-memory cache.
+    """
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        if query and not variables and is_introspection_query(query, operation_name):
+            return execute_introspection(query, operation_name)
+        return super().execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql)
+
+
+def schema_sdl(request):
+    """Serves the printed schema (SDL), built once per process."""
+    return HttpResponse(get_sdl(), content_type='text/plain; charset=utf-8')
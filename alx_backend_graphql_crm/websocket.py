@@ -0,0 +1,127 @@
+"""
+Websocket transport for GraphQL subscriptions.
+
+Speaks the ``graphql-transport-ws`` protocol (the one used by graphql-ws,
+Apollo Client and GraphiQL) directly on ASGI, so no extra server package is
+needed. Queries and mutations keep going through the HTTP view; the socket
+only runs subscription operations.
+"""
+
+import asyncio
+import json
+
+from graphql import ExecutionResult, OperationType, get_operation_ast, parse, GraphQLError
+
+PROTOCOL = 'graphql-transport-ws'
+
+
+class GraphQLWebSocketApp:
+    def __init__(self, get_schema):
+        # A callable, so the schema is only built once a subscription needs it
+        self.get_schema = get_schema
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        if PROTOCOL not in scope.get('subprotocols', []):
+            await send({'type': 'websocket.close', 'code': 4406})
+            return
+        await send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+
+        operations = {}
+        acknowledged = False
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                try:
+                    data = json.loads(message.get('text') or message.get('bytes') or '')
+                    message_type = data['type']
+                except (ValueError, TypeError, KeyError):
+                    await self.close(send, 4400, "Invalid message received")
+                    break
+
+                if message_type == 'connection_init':
+                    if acknowledged:
+                        await self.close(send, 4429, "Too many initialisation requests")
+                        break
+                    acknowledged = True
+                    await self.send_json(send, {'type': 'connection_ack'})
+                elif message_type == 'ping':
+                    await self.send_json(send, {'type': 'pong'})
+                elif message_type == 'pong':
+                    pass
+                elif message_type == 'subscribe':
+                    if not acknowledged:
+                        await self.close(send, 4401, "Unauthorized")
+                        break
+                    operation_id = data.get('id')
+                    if operation_id in operations:
+                        await self.close(send, 4409, f"Subscriber for {operation_id} already exists")
+                        break
+                    operations[operation_id] = asyncio.create_task(
+                        self.run_operation(send, operation_id, data.get('payload') or {}, operations)
+                    )
+                elif message_type == 'complete':
+                    task = operations.pop(data.get('id'), None)
+                    if task is not None:
+                        task.cancel()
+                else:
+                    await self.close(send, 4400, f"Unknown message type '{message_type}'")
+                    break
+        finally:
+            for task in operations.values():
+                task.cancel()
+
+    async def run_operation(self, send, operation_id, payload, operations):
+        stream = None
+        try:
+            query = payload.get('query') or ''
+            try:
+                operation = get_operation_ast(parse(query), payload.get('operationName'))
+            except GraphQLError as error:
+                await self.send_errors(send, operation_id, [error])
+                return
+            if operation is None or operation.operation != OperationType.SUBSCRIPTION:
+                await self.send_errors(send, operation_id, [GraphQLError(
+                    "Only subscription operations are served over websockets; "
+                    "send queries and mutations to the HTTP endpoint."
+                )])
+                return
+
+            stream = await self.get_schema().subscribe(
+                query,
+                variable_values=payload.get('variables'),
+                operation_name=payload.get('operationName'),
+            )
+            if isinstance(stream, ExecutionResult):
+                await self.send_errors(send, operation_id, stream.errors)
+                return
+            async for result in stream:
+                await self.send_json(send, {'type': 'next', 'id': operation_id, 'payload': result.formatted})
+            await self.send_json(send, {'type': 'complete', 'id': operation_id})
+        except Exception as error:
+            # Anything escaping the stream ends this operation only; tell the client why
+            await self.send_errors(send, operation_id, [
+                error if isinstance(error, GraphQLError) else GraphQLError(str(error), original_error=error)
+            ])
+        finally:
+            if stream is not None and hasattr(stream, 'aclose'):
+                await stream.aclose() # Unregisters the subscriber from the pub/sub broker
+            if operations.get(operation_id) is asyncio.current_task():
+                del operations[operation_id]
+
+    async def send_errors(self, send, operation_id, errors):
+        await self.send_json(send, {
+            'type': 'error', 'id': operation_id, 'payload': [error.formatted for error in errors],
+        })
+
+    @staticmethod
+    async def send_json(send, data):
+        await send({'type': 'websocket.send', 'text': json.dumps(data, default=str)})
+
+    @staticmethod
+    async def close(send, code, reason):
+        await send({'type': 'websocket.close', 'code': code, 'reason': reason})
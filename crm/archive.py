@@ -0,0 +1,178 @@
+# crm/archive.py
+# Hot/cold storage for orders.
+#
+# Orders older than a horizon are moved, in small batches, from Order (hot)
+# into ArchivedOrder (cold), together with their product links. The
+# ArchiveWatermark records a date before which every archived row lies, so a
+# query whose order_date range starts at or after it only touches the hot
+# table. OrderFilter uses route() to pick hot, cold or both.
+#
+# Each process caches the watermark for CRM_ARCHIVE_WATERMARK_SECONDS. That is
+# only safe because the watermark is raised before any row is moved past the
+# old value: archive_orders advances it, waits out the cache lifetime, and
+# archive_batch never moves rows dated at or after it.
+import copy
+import time
+from datetime import date, datetime, time as day_start
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, ArchivedOrder, ArchiveWatermark
+
+HOT = 'hot'
+COLD = 'cold'
+BOTH = 'both'
+
+WATERMARK_NAME = 'orders'
+
+
+_cached_watermark = (None, None) # (value, time.monotonic() it was read)
+
+def watermark_cache_seconds():
+    return getattr(settings, 'CRM_ARCHIVE_WATERMARK_SECONDS', 30)
+
+def watermark():
+    global _cached_watermark
+    value, read_at = _cached_watermark
+    if read_at is None or time.monotonic() - read_at >= watermark_cache_seconds():
+        value = ArchiveWatermark.objects.filter(name=WATERMARK_NAME).values_list('before', flat=True).first()
+        _cached_watermark = (value, time.monotonic())
+    return value
+
+def advance_watermark(before):
+    """
+    Raises the watermark to `before` (it never moves back). Returns True if it
+    moved; other processes may keep routing by the old value for up to
+    watermark_cache_seconds(), so wait that long before archiving past it.
+    """
+    global _cached_watermark
+    with transaction.atomic():
+        current = ArchiveWatermark.objects.select_for_update().filter(name=WATERMARK_NAME).first()
+        if current is None:
+            ArchiveWatermark.objects.create(name=WATERMARK_NAME, before=before)
+        elif before > current.before:
+            current.before = before
+            current.save(update_fields=['before'])
+        else:
+            before = None
+    _cached_watermark = (None, None)
+    return before is not None
+
+def _as_datetime(value):
+    # OrderFilter's date filters hand over dates; compare them as midnight, like the lookups do
+    if value is None:
+        return None
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, day_start.min)
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+def route(order_date_gte=None, order_date_lte=None):
+    """
+    Returns HOT, COLD or BOTH for an order_date range (either bound may be None).
+    """
+    before = watermark()
+    if before is None:
+        return HOT # Nothing archived yet
+    gte, lte = _as_datetime(order_date_gte), _as_datetime(order_date_lte)
+    if gte is not None and gte >= before:
+        return HOT
+    if lte is not None and lte < before:
+        # Old range: cold, unless backdated orders created since the last pass still sit in the hot table
+        recent = Order.objects.filter(order_date__lte=lte)
+        if gte is not None:
+            recent = recent.filter(order_date__gte=gte)
+        if not recent.exists():
+            return COLD
+    return BOTH
+
+
+class MergedOrders:
+    """
+    Read-only view over a hot and a cold order queryset, merged in their
+    shared ordering. Slicing is lazy, which is what graphene-django's
+    connection pagination relies on.
+
+    Each page is one UNION ALL statement over both tables, ordered and sliced
+    by the database, so it sorts with the database's collation and sees a
+    single snapshot of both tables. The page's rows are then loaded by pk.
+    """
+    def __init__(self, hot, cold, start=0, stop=None):
+        ordering = list(hot.query.order_by) or ['-order_date']
+        if not any(f.lstrip('-') in ('pk', 'id') for f in ordering):
+            ordering.append('pk') # Ids are shared by both tables, so this makes the order total
+        columns = ['pk'] + [f.lstrip('-') for f in ordering if f.lstrip('-') not in ('pk', 'id')]
+        ordering = ['-pk' if f == '-id' else 'pk' if f == 'id' else f for f in ordering]
+        # Subqueries of a compound statement must not be ordered themselves
+        self.rows = hot.order_by().values(*columns).union(cold.order_by().values(*columns), all=True).order_by(*ordering)
+        self.hot_model = hot.model
+        self.cold_model = cold.model
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        total = self.rows.count()
+        stop = total if self.stop is None else min(self.stop, total)
+        return max(stop - self.start, 0)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return list(self[item:item + 1])[0]
+        if (item.start or 0) < 0 or (item.stop is not None and item.stop < 0) or item.step not in (None, 1):
+            raise ValueError("MergedOrders only supports non-negative slices without a step.")
+        start = self.start + (item.start or 0)
+        stop = self.stop if item.stop is None else self.start + item.stop
+        if self.stop is not None and stop is not None:
+            stop = min(stop, self.stop)
+        merged = copy.copy(self)
+        merged.start, merged.stop = start, stop
+        return merged
+
+    def __iter__(self):
+        if self.stop is not None and self.stop <= self.start:
+            return iter(())
+        pks = [row['pk'] for row in self.rows[self.start:self.stop]]
+        # Look in both tables: a row archived since the page query is found in the cold one
+        found = {order.pk: order for order in self.hot_model.objects.filter(pk__in=pks)}
+        found.update((order.pk, order) for order in self.cold_model.objects.filter(pk__in=pks))
+        return iter([found[pk] for pk in pks if pk in found])
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Moves roughly `batch_size` of the oldest orders dated before both `cutoff`
+    and the watermark to the archive in one transaction. Orders sharing an
+    order_date are always moved together. Returns the number moved; raise the
+    watermark with advance_watermark() first.
+    """
+    before = ArchiveWatermark.objects.filter(name=WATERMARK_NAME).values_list('before', flat=True).first()
+    if before is None:
+        return 0
+    cutoff = min(cutoff, before)
+    candidates = Order.objects.filter(order_date__lt=cutoff).order_by('order_date').values_list('order_date', flat=True)
+    oldest = candidates.first()
+    if oldest is None:
+        return 0
+    upper = candidates[batch_size:batch_size + 1].first() or cutoff
+    if upper <= oldest:
+        upper = candidates.filter(order_date__gt=oldest).first() or cutoff
+
+    Through = Order.products.through
+    ArchivedThrough = ArchivedOrder.products.through
+    with transaction.atomic():
+        batch = list(Order.objects.select_for_update().filter(order_date__lt=upper))
+        order_ids = [order.pk for order in batch]
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=order.pk, customer_id=order.customer_id, order_date=order.order_date,
+                total_amount=order.total_amount, created_at=order.created_at,
+            )
+            for order in batch
+        ])
+        ArchivedThrough.objects.bulk_create([
+            ArchivedThrough(archivedorder_id=order_id, product_id=product_id)
+            for order_id, product_id in Through.objects.filter(order_id__in=order_ids).values_list('order_id', 'product_id')
+        ])
+        Order.objects.filter(pk__in=order_ids).delete()
+    return len(batch)
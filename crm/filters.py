@@ -2,6 +2,7 @@
 import django_filters
 from django.db.models import Q # For complex lookups
 from .models import Customer, Product, Order
+from . import archive
 
 class CustomerFilter(django_filters.FilterSet):
     # Field names here will be used to generate GraphQL filter arguments
@@ -43,6 +44,7 @@ class ProductFilter(django_filters.FilterSet):
     price_lte = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
 
     # To match checkpoint's 'stockGte' and 'stockLte' (if needed, checkpoint only showed orderBy)
+    # 'stock' is the materialized total of the product's stock shards, so these stay plain column lookups
     stock_gte = django_filters.NumberFilter(field_name='stock', lookup_expr='gte')
     stock_lte = django_filters.NumberFilter(field_name='stock', lookup_expr='lte')
     stock_exact = django_filters.NumberFilter(field_name='stock', lookup_expr='exact') # For exact stock match
@@ -112,6 +114,23 @@ class OrderFilter(django_filters.FilterSet):
             'customer_name', 'product_name', 'has_product_id'
         ]
 
+    def __init__(self, *args, archived=None, **kwargs):
+        # archived: the ArchivedOrder queryset covering the same orders as `queryset`
+        # (passed by crm.schema.OrderConnectionField); without it only hot orders are searched
+        super().__init__(*args, **kwargs)
+        self.archived = archived
+
+    def filter_queryset(self, queryset):
+        # Route to hot and/or archived orders based on the requested date range.
+        # ArchivedOrder mirrors Order's fields, so every filter above applies to both.
+        storage = archive.route(self.form.cleaned_data.get('order_date_gte'), self.form.cleaned_data.get('order_date_lte'))
+        if storage == archive.HOT or self.archived is None:
+            return super().filter_queryset(queryset)
+        cold = super().filter_queryset(self.archived)
+        if storage == archive.COLD:
+            return cold
+        return archive.MergedOrders(super().filter_queryset(queryset), cold)
+
     def filter_has_product_id(self, queryset, name, value):
         # name is 'has_product_id'
         # value is the product ID
@@ -0,0 +1,166 @@
+# crm/importers.py
+# Streaming readers and chunk validators used by `manage.py import_crm`.
+# Nothing here touches the database, so validate_chunk can run in a worker process.
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from .validators import is_valid_phone, validate_amount, validate_product_fields
+
+KINDS = ('customers', 'products', 'orders') # Import order: orders reference the other two
+
+def detect_format(path):
+    lowered = str(path).lower()
+    if lowered.endswith('.csv'):
+        return 'csv'
+    if lowered.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    raise ValueError(f"Cannot infer format of '{path}', pass --format csv or --format ndjson.")
+
+def iter_records(fileobj, fmt):
+    """
+    Yields (line_number, raw_record) pairs without loading the whole file.
+    CSV rows are parsed here (quoted fields may span lines); NDJSON lines are
+    passed through as strings so decoding happens in the validation workers.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(fileobj)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(fileobj, start=1):
+            if line.strip():
+                yield line_number, line
+
+def iter_chunks(records, chunk_size):
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def _text(record, key):
+    value = record.get(key)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def _clean_customer(record):
+    errors = []
+    name = _text(record, 'name')
+    email = _text(record, 'email')
+    phone = _text(record, 'phone')
+    if not name:
+        errors.append("Name is required.")
+    if not email:
+        errors.append("Email is required.")
+    if phone and not is_valid_phone(phone):
+        errors.append(f"Invalid phone number format: {phone}.")
+    cleaned = {'source_id': _text(record, 'id'), 'name': name, 'email': email, 'phone': phone}
+    return cleaned, errors
+
+def _clean_product(record):
+    errors = []
+    name = _text(record, 'name')
+    if not name:
+        errors.append("Name is required.")
+    try:
+        price = Decimal(_text(record, 'price') or '')
+    except InvalidOperation:
+        return None, errors + [f"Invalid price: {record.get('price')!r}."]
+    try:
+        stock = int(_text(record, 'stock') or 0)
+    except ValueError:
+        return None, errors + [f"Invalid stock: {record.get('stock')!r}."]
+    errors.extend(validate_product_fields(price, stock))
+    cleaned = {
+        'source_id': _text(record, 'id'),
+        'name': name,
+        'description': _text(record, 'description'),
+        'price': price,
+        'stock': stock,
+    }
+    return cleaned, errors
+
+def _clean_order(record):
+    errors = []
+    customer_id = _text(record, 'customer_id')
+    customer_email = _text(record, 'customer_email')
+    if customer_id:
+        customer_ref = ('id', customer_id)
+    elif customer_email:
+        customer_ref = ('email', customer_email)
+    else:
+        customer_ref = None
+        errors.append("customer_id or customer_email is required.")
+
+    product_ids = record.get('product_ids') or []
+    if isinstance(product_ids, str):
+        # CSV cells hold a ';' separated list, e.g. "3;7;12"
+        product_ids = product_ids.replace(';', ' ').split()
+    product_ids = [str(p).strip() for p in product_ids if str(p).strip()]
+    if not product_ids:
+        errors.append("At least one product ID must be provided.")
+
+    order_date = None
+    if _text(record, 'order_date'):
+        try:
+            order_date = datetime.fromisoformat(_text(record, 'order_date'))
+        except ValueError:
+            errors.append(f"Invalid order_date: {record.get('order_date')!r}.")
+
+    total_amount = None
+    if _text(record, 'total_amount'):
+        try:
+            total_amount = Decimal(_text(record, 'total_amount'))
+        except InvalidOperation:
+            errors.append(f"Invalid total_amount: {record.get('total_amount')!r}.")
+        else:
+            errors.extend(validate_amount(total_amount, "total_amount"))
+
+    cleaned = {
+        'customer_ref': customer_ref,
+        'product_ids': product_ids,
+        'order_date': order_date,
+        'total_amount': total_amount,
+    }
+    return cleaned, errors
+
+CLEANERS = {
+    'customers': _clean_customer,
+    'products': _clean_product,
+    'orders': _clean_order,
+}
+
+def validate_chunk(kind, chunk):
+    """
+    Validates a list of (line_number, raw_record) pairs.
+    Returns (valid, invalid): valid holds (line_number, cleaned) pairs and
+    invalid holds (line_number, [messages]) pairs.
+    """
+    clean = CLEANERS[kind]
+    valid, invalid = [], []
+    for line_number, raw in chunk:
+        if isinstance(raw, str):
+            try:
+                raw = json.loads(raw)
+            except ValueError as e:
+                invalid.append((line_number, [f"Invalid JSON: {e}."]))
+                continue
+        if not isinstance(raw, dict):
+            invalid.append((line_number, ["Expected a JSON object."]))
+            continue
+        try:
+            cleaned, errors = clean(raw)
+        except (ValueError, TypeError, ArithmeticError) as e:
+            # Never let one malformed row abort the whole import from inside a worker
+            invalid.append((line_number, [f"Invalid row: {e}."]))
+            continue
+        if errors:
+            invalid.append((line_number, errors))
+        else:
+            valid.append((line_number, cleaned))
+    return valid, invalid
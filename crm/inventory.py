@@ -0,0 +1,274 @@
+# crm/inventory.py
+# Sharded stock counters with a reservation ledger.
+#
+# A product's stock is split across StockShard rows. Holding stock decrements
+# one shard (picked at random, skipping shards locked by other transactions
+# where the database supports it), so concurrent orders for the same product
+# no longer serialize on a single row. Product.stock is kept as a materialized
+# sum of the shards, refreshed after commit at most once per interval, and is
+# what ProductNode.stock and ProductFilter read. Every function here that
+# changes a product's total publishes a stock event once the change commits.
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+
+from .models import Product, StockShard, StockReservation
+from .pubsub import STOCK_CHANNEL, publish_on_commit, stock_event
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id, requested):
+        super().__init__(f"Product {product_id} has fewer than {requested} units available.")
+        self.product_id = product_id
+        self.requested = requested
+
+
+def shard_count():
+    return getattr(settings, 'CRM_STOCK_SHARDS', 8)
+
+def split(total, shards):
+    # split(10, 4) -> [3, 3, 2, 2]
+    base, extra = divmod(total, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+def initialize_shards(products, shards=None):
+    """
+    Seeds shards from Product.stock for products that have none yet.
+    Returns the number of shard rows created.
+    """
+    products = list(products)
+    count = shards or shard_count()
+    existing = set(
+        StockShard.objects.filter(product_id__in=[p.pk for p in products]).values_list('product_id', flat=True)
+    )
+    new_shards = [
+        StockShard(product_id=p.pk, shard=i, quantity=quantity)
+        for p in products if p.pk not in existing
+        for i, quantity in enumerate(split(p.stock, count))
+    ]
+    # ignore_conflicts: two requests may seed the same product concurrently
+    StockShard.objects.bulk_create(new_shards, ignore_conflicts=True)
+    return len(new_shards)
+
+def _spread(product_pk, current, total, shards):
+    # Rewrites the locked `current` shard rows so `shards` of them hold `total`.
+    # Surplus shard rows are emptied rather than deleted so the ledger keeps its history.
+    quantities = split(total, shards)
+    by_number = {s.shard: s for s in current}
+    for number in range(max(shards, len(current))):
+        quantity = quantities[number] if number < shards else 0
+        if number in by_number:
+            StockShard.objects.filter(pk=by_number[number].pk).update(quantity=quantity)
+        else:
+            StockShard.objects.create(product_id=product_pk, shard=number, quantity=quantity)
+
+@transaction.atomic
+def reshard(product_pk, shards):
+    """
+    Redistributes a product's current stock across `shards` shards.
+    """
+    current = list(StockShard.objects.select_for_update().filter(product_id=product_pk).order_by('shard'))
+    if not current:
+        return initialize_shards(Product.objects.filter(pk=product_pk), shards)
+    _spread(product_pk, current, sum(s.quantity for s in current), shards)
+    refresh_on_commit([product_pk])
+    announce({product_pk: 0}) # The total is unchanged, so this normally publishes nothing
+    return shards
+
+@transaction.atomic
+def set_stock(product_pk, total):
+    """
+    Replaces the product's stock with `total`, spread over its existing shards.
+    This is what saving a new Product.stock does (see crm.signals).
+    Held reservations are unaffected.
+    """
+    if total < 0:
+        raise ValueError("Stock cannot be negative.")
+    current = list(StockShard.objects.select_for_update().filter(product_id=product_pk).order_by('shard'))
+    if not current:
+        # Never sharded (e.g. bulk_create): the previous total is unknown, so announce it as such
+        _spread(product_pk, current, total, shard_count())
+        name = Product.objects.filter(pk=product_pk).values_list('name', flat=True).first()
+        publish_on_commit(STOCK_CHANNEL, [stock_event(product_pk, name, total)])
+        return
+    _spread(product_pk, current, total, len(current))
+    refresh_on_commit([product_pk])
+    announce({product_pk: total - sum(s.quantity for s in current)})
+
+def _pick_shard(product_pk):
+    shards = StockShard.objects.filter(product_id=product_pk, quantity__gt=0).order_by('?')
+    if connection.features.has_select_for_update_skip_locked:
+        # Prefer a shard no other transaction is decrementing right now
+        shard = shards.select_for_update(skip_locked=True).first()
+        if shard is not None:
+            return shard
+    shard = shards.first()
+    if shard is None and initialize_shards(Product.objects.filter(pk=product_pk)):
+        shard = shards.first() # Product created before sharding (or by bulk_create)
+    return shard
+
+@transaction.atomic
+def hold(product_pk, quantity=1):
+    """
+    Takes `quantity` units out of the product's shards and records them as
+    held reservations. Raises OutOfStock, leaving every shard untouched, when
+    not enough stock remains.
+    """
+    reservations = []
+    remaining = quantity
+    while remaining:
+        shard = _pick_shard(product_pk)
+        if shard is None:
+            raise OutOfStock(product_pk, quantity)
+        take = min(remaining, shard.quantity)
+        # Conditional update: another transaction may have drained the shard since we read it
+        if StockShard.objects.filter(pk=shard.pk, quantity__gte=take).update(quantity=F('quantity') - take):
+            reservations.append(StockReservation(product_id=product_pk, shard=shard, quantity=take))
+            remaining -= take
+    StockReservation.objects.bulk_create(reservations)
+    refresh_on_commit([product_pk])
+    announce({product_pk: -quantity})
+    return reservations
+
+def commit(reservations, order=None):
+    """
+    Marks held reservations as final, optionally linking them to an order.
+    Returns how many were committed; already committed or released ones are skipped.
+    """
+    return StockReservation.objects.filter(
+        pk__in=[r.pk for r in reservations], status=StockReservation.HELD,
+    ).update(status=StockReservation.COMMITTED, order=order)
+
+@transaction.atomic
+def release(reservations):
+    """
+    Returns held stock to the shard it came from. Returns how many reservations were released.
+    """
+    released = []
+    changes = Counter()
+    for reservation in reservations:
+        if StockReservation.objects.filter(pk=reservation.pk, status=StockReservation.HELD).update(
+                status=StockReservation.RELEASED):
+            StockShard.objects.filter(pk=reservation.shard_id).update(quantity=F('quantity') + reservation.quantity)
+            released.append(reservation)
+            changes[reservation.product_id] += reservation.quantity
+    refresh_on_commit(changes)
+    announce(changes)
+    return len(released)
+
+@transaction.atomic
+def restock(product_pk, quantity):
+    initialize_shards(Product.objects.filter(pk=product_pk))
+    shard_ids = list(StockShard.objects.filter(product_id=product_pk).order_by('shard').values_list('id', flat=True))
+    # Random offset so repeated small restocks do not always land on shard 0
+    offset = random.randrange(len(shard_ids))
+    for i, amount in enumerate(split(quantity, len(shard_ids))):
+        if amount:
+            shard_id = shard_ids[(i + offset) % len(shard_ids)]
+            StockShard.objects.filter(pk=shard_id).update(quantity=F('quantity') + amount)
+    refresh_on_commit([product_pk])
+    announce({product_pk: quantity})
+
+def stock_levels(product_pks):
+    # Live totals straight from the shards; use Product.stock for the materialized value
+    return dict(
+        StockShard.objects.filter(product_id__in=product_pks)
+        .values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+
+def announce(changes):
+    """
+    Publishes, after commit, a stock event for every product in `changes`
+    (product pk -> change in its total just made) whose total moved.
+    """
+    changes = {pk: change for pk, change in changes.items() if change}
+    if not changes:
+        return
+    levels = stock_levels(changes)
+    names = dict(Product.objects.filter(pk__in=changes).values_list('pk', 'name'))
+    publish_on_commit(STOCK_CHANNEL, [
+        stock_event(pk, names[pk], levels[pk], previous_stock=levels[pk] - change)
+        for pk, change in changes.items() if pk in names
+    ])
+
+def refresh_stock(product_pks):
+    total = (
+        StockShard.objects.filter(product=OuterRef('pk'))
+        .values('product').annotate(total=Sum('quantity')).values('total')
+    )
+    return Product.objects.filter(
+        pk__in=StockShard.objects.filter(product_id__in=product_pks).values('product_id'),
+    ).update(stock=Subquery(total))
+
+def refresh_interval():
+    return getattr(settings, 'CRM_STOCK_REFRESH_SECONDS', 1.0)
+
+_pending = set()
+_pending_lock = threading.Lock()
+_timer = None
+_last_flush = 0.0
+
+def flush_refreshes():
+    """
+    Refreshes every product with a pending refresh now. Returns how many
+    products were refreshed.
+    """
+    global _timer, _last_flush
+    with _pending_lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        product_pks = list(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    if not product_pks:
+        return 0
+    try:
+        refresh_stock(product_pks)
+    except DatabaseError:
+        # Busy database: keep them pending for the next flush rather than losing the refresh
+        _schedule(product_pks)
+        raise
+    return len(product_pks)
+
+def _flush_in_background():
+    try:
+        flush_refreshes()
+    except DatabaseError:
+        pass # Rescheduled by flush_refreshes
+    finally:
+        connection.close() # Timer threads get their own connection
+
+def _schedule(product_pks):
+    global _timer
+    with _pending_lock:
+        _pending.update(product_pks)
+        if _timer is None:
+            delay = max(0.0, _last_flush + refresh_interval() - time.monotonic())
+            _timer = threading.Timer(delay, _flush_in_background)
+            _timer.daemon = True
+            _timer.start()
+
+def refresh_on_commit(product_pks):
+    """
+    Brings Product.stock up to date after the current transaction commits.
+
+    Refreshes are coalesced: each process updates a product's row at most once
+    per CRM_STOCK_REFRESH_SECONDS however many orders touch it, so Product.stock
+    may trail the shards by that long (stock_levels() reads the live totals).
+    With the setting at 0 every commit refreshes straight away. Refreshes still
+    pending when a process exits are lost until the next change to the product
+    or a run of `manage.py refresh_stock`.
+    """
+    product_pks = list(product_pks)
+    if not product_pks:
+        return
+    if refresh_interval() <= 0:
+        transaction.on_commit(lambda: refresh_stock(product_pks))
+    else:
+        transaction.on_commit(lambda: _schedule(product_pks))
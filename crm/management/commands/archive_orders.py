@@ -0,0 +1,54 @@
+# crm/management/commands/archive_orders.py
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from crm.archive import advance_watermark, archive_batch, watermark_cache_seconds
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves orders older than the archive horizon, with their product links, into the order archive. "
+        "Works in small batches with a pause in between so it can run alongside normal traffic (e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'CRM_ORDER_ARCHIVE_DAYS', 365),
+            help="Archive orders dated more than this many days ago.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.1, help="Seconds to sleep between batches.")
+        parser.add_argument('--max-batches', type=int, help="Stop after this many batches; the next run continues.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--days must be 0 or more and --batch-size at least 1.")
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        if advance_watermark(cutoff):
+            # Other processes route queries by a cached watermark; let them all see the new one
+            # before moving anything past the old value
+            wait = watermark_cache_seconds()
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"watermark raised to {cutoff:%Y-%m-%d %H:%M}, waiting {wait}s")
+            time.sleep(wait)
+
+        moved = batches = 0
+        started = time.monotonic()
+        while options['max_batches'] is None or batches < options['max_batches']:
+            count = archive_batch(cutoff, options['batch_size'])
+            if not count:
+                break
+            moved += count
+            batches += 1
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"batch {batches}: {count} orders archived")
+            time.sleep(options['pause'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved} orders dated before {cutoff:%Y-%m-%d %H:%M} in {batches} batches ({elapsed:.1f}s)"
+        ))
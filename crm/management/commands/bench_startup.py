@@ -0,0 +1,66 @@
+# crm/management/commands/bench_startup.py
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter per sample so every import is cold
+CHILD = r'''
+import json, os, sys, time
+started = time.perf_counter()
+os.environ['DJANGO_SETTINGS_MODULE'] = sys.argv[1]
+from alx_backend_graphql_crm.wsgi import application  # What a worker loads at boot
+booted = time.perf_counter()
+from django.test import Client
+client = Client(HTTP_HOST='localhost')
+timings = {'boot': booted - started}
+for label in ('first', 'second'):
+    before = time.perf_counter()
+    response = client.post('/graphql', {'query': sys.argv[2]}, content_type='application/json')
+    timings[label] = time.perf_counter() - before
+    timings['status'] = response.status_code
+print(json.dumps(timings))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures cold worker boot (importing the WSGI app) and first/second GraphQL request latency, "
+        "each sample in a fresh Python process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument(
+            '--query', default='{ hello }',
+            help="Query sent for the first and second request; try an introspection query to see the cache.",
+        )
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs must be at least 1.")
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
+
+        samples = []
+        for _ in range(options['runs']):
+            completed = subprocess.run(
+                [sys.executable, '-c', CHILD, settings_module, options['query']],
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+            )
+            if completed.returncode != 0:
+                raise CommandError(f"Benchmark process failed:\n{completed.stderr}")
+            samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+        statuses = {sample['status'] for sample in samples}
+        if statuses != {200}:
+            self.stderr.write(self.style.WARNING(f"GraphQL responded with status {sorted(statuses)}"))
+        for label in ('boot', 'first', 'second'):
+            values = [sample[label] * 1000 for sample in samples]
+            self.stdout.write(
+                f"{label:>6}: median {statistics.median(values):8.1f} ms  "
+                f"min {min(values):8.1f} ms  max {max(values):8.1f} ms"
+            )
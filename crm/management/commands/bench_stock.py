@@ -0,0 +1,104 @@
+# crm/management/commands/bench_stock.py
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.test.utils import override_settings
+
+from crm import inventory
+from crm.models import Customer, Product, Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures order throughput on a single hot product for several stock shard counts. "
+        "Writes throwaway rows to the configured database and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--orders', type=int, default=2000, help="Orders placed per shard count.")
+        parser.add_argument(
+            '--work-ms', type=float, default=2.0,
+            help="Time spent inside each order transaction after the hold, standing in for the rest of CreateOrder.",
+        )
+        parser.add_argument(
+            '--refresh-seconds', type=float,
+            help="Override CRM_STOCK_REFRESH_SECONDS for the run; 0 refreshes Product.stock after every order.",
+        )
+
+    def handle(self, *args, **options):
+        if min(options['shards']) < 1 or options['threads'] < 1 or options['orders'] < 1:
+            raise CommandError("--shards, --threads and --orders must be at least 1.")
+        if connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING(
+                "SQLite locks the whole database for every write, so shard count cannot change throughput here. "
+                "Point DATABASES at PostgreSQL to measure scaling."
+            ))
+
+        refresh = options['refresh_seconds']
+        if refresh is None:
+            refresh = inventory.refresh_interval()
+        self.stdout.write(f"Product.stock refresh interval: {refresh}s")
+        with override_settings(CRM_STOCK_REFRESH_SECONDS=refresh):
+            self.bench(options)
+
+    def bench(self, options):
+        customer = Customer.objects.create(name="bench_stock", email=f"bench_stock_{time.time_ns()}@example.invalid")
+        try:
+            self.stdout.write(f"{'shards':>6} {'orders':>7} {'failed':>7} {'seconds':>8} {'orders/s':>9} {'stock ok':>8}")
+            for shards in options['shards']:
+                product = Product.objects.create(name="bench_stock", price=Decimal('1.00'), stock=options['orders'])
+                inventory.reshard(product.pk, shards)
+                placed, failed, elapsed = self.run(
+                    customer, product, options['orders'], options['threads'], options['work_ms'] / 1000)
+                # The timed run includes every refresh it triggered; pending coalesced ones are flushed
+                # here only to check that Product.stock ends up matching the shards
+                inventory.flush_refreshes()
+                product.refresh_from_db()
+                stock_ok = product.stock == inventory.stock_levels([product.pk])[product.pk] == options['orders'] - placed
+                self.stdout.write(
+                    f"{shards:>6} {placed:>7} {failed:>7} {elapsed:>8.2f} {placed / elapsed:>9.0f} {'yes' if stock_ok else 'NO':>8}")
+                Order.objects.filter(customer=customer).delete()
+                product.delete()
+        finally:
+            customer.delete()
+
+    def run(self, customer, product, orders, threads, work_seconds):
+        remaining = [orders]
+        counts = {'placed': 0, 'failed': 0}
+        lock = threading.Lock()
+
+        def place_orders():
+            try:
+                while True:
+                    with lock:
+                        if not remaining[0]:
+                            return
+                        remaining[0] -= 1
+                    try:
+                        # Same critical section as CreateOrder: hold, create the order, commit the hold
+                        with transaction.atomic():
+                            reservations = inventory.hold(product.pk)
+                            time.sleep(work_seconds)
+                            order = Order.objects.create(customer=customer, total_amount=product.price)
+                            order.products.add(product)
+                            inventory.commit(reservations, order=order)
+                        outcome = 'placed'
+                    except (inventory.OutOfStock, DatabaseError):
+                        outcome = 'failed'
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close() # Each thread has its own connection
+
+        workers = [threading.Thread(target=place_orders) for _ in range(threads)]
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return counts['placed'], counts['failed'], time.monotonic() - started
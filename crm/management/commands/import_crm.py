@@ -0,0 +1,239 @@
+# crm/management/commands/import_crm.py
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from crm.importers import KINDS, detect_format, iter_chunks, iter_records, validate_chunk
+from crm.models import Customer, Product, Order, ImportCheckpoint, ImportedRow
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams customers, products and orders from CSV or NDJSON files into the database. "
+        "Rows are validated in parallel chunks and written with bulk_create, one transaction per chunk, "
+        "so an interrupted import can be continued with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', help="CSV/NDJSON file with id, name, email, phone.")
+        parser.add_argument('--products', help="CSV/NDJSON file with id, name, description, price, stock.")
+        parser.add_argument(
+            '--orders',
+            help="CSV/NDJSON file with customer_id or customer_email, product_ids, order_date, total_amount.",
+        )
+        parser.add_argument('--format', choices=('csv', 'ndjson'), help="Override format detection by extension.")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--workers', type=int, default=min(4, os.cpu_count() or 1),
+            help="Validation processes; 1 validates in the main process.",
+        )
+        parser.add_argument('--job', default='default', help="Name under which progress and id maps are stored.")
+        parser.add_argument('--resume', action='store_true', help="Continue the job from its last committed chunk.")
+
+    def handle(self, *args, **options):
+        paths = {kind: options[kind] for kind in KINDS if options[kind]}
+        if not paths:
+            raise CommandError("Nothing to import: pass --customers, --products and/or --orders.")
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError("--chunk-size and --workers must be at least 1.")
+
+        self.job = options['job']
+        self.chunk_size = options['chunk_size']
+        self.workers = options['workers']
+        self.verbosity = options['verbosity']
+
+        if not options['resume']:
+            ImportCheckpoint.objects.filter(job=self.job).delete()
+            ImportedRow.objects.filter(job=self.job).delete()
+
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        try:
+            for kind, path in paths.items():
+                try:
+                    fmt = options['format'] or detect_format(path)
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.import_file(kind, path, fmt, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def import_file(self, kind, path, fmt, executor):
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(job=self.job, kind=kind)
+        rows_done = checkpoint.rows_done
+        if rows_done:
+            self.stdout.write(f"{kind}: resuming {path} after {rows_done} rows")
+
+        write_chunk = getattr(self, f'write_{kind}')
+        if kind == 'orders':
+            self.customer_ids = self.load_id_map('customers')
+            self.product_ids = self.load_id_map('products')
+
+        created = rejected = processed = 0
+        started = time.monotonic()
+        try:
+            fileobj = open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f"Cannot open {path}: {e}")
+        with fileobj:
+            records = iter_records(fileobj, fmt)
+            next(islice(records, rows_done, rows_done), None) # Skip rows committed by an earlier run
+            chunks = iter_chunks(records, self.chunk_size)
+            for size, (valid, invalid) in self.validated_chunks(kind, chunks, executor):
+                with transaction.atomic():
+                    written, write_errors = write_chunk(valid)
+                    rows_done += size
+                    ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(rows_done=rows_done)
+
+                for line_number, errors in sorted(invalid + write_errors):
+                    self.stderr.write(f"{path}:{line_number}: {' '.join(errors)}")
+                created += written
+                rejected += len(invalid) + len(write_errors)
+                processed += size
+                if self.verbosity >= 2:
+                    self.stdout.write(f"{kind}: {rows_done} rows read, {self.rate(processed, started)}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{kind}: {created} created, {rejected} rejected from {processed} rows "
+            f"in {time.monotonic() - started:.1f}s ({self.rate(processed, started)})"
+        ))
+
+    def validated_chunks(self, kind, chunks, executor):
+        # Yields (chunk_size, validate_chunk result) in file order. At most
+        # 2 * workers chunks are in flight, so memory stays bounded however
+        # large the input file is.
+        if executor is None:
+            for chunk in chunks:
+                yield len(chunk), validate_chunk(kind, chunk)
+            return
+        pending = deque()
+        for chunk in chunks:
+            pending.append((len(chunk), executor.submit(validate_chunk, kind, chunk)))
+            if len(pending) >= 2 * self.workers:
+                size, future = pending.popleft()
+                yield size, future.result()
+        while pending:
+            size, future = pending.popleft()
+            yield size, future.result()
+
+    @staticmethod
+    def rate(rows, started):
+        elapsed = time.monotonic() - started
+        return f"{rows / elapsed:.0f} rows/s" if elapsed > 0 else "- rows/s"
+
+    def load_id_map(self, kind):
+        return dict(
+            ImportedRow.objects.filter(job=self.job, kind=kind).values_list('source_id', 'object_id').iterator()
+        )
+
+    def known_source_ids(self, kind, rows):
+        source_ids = [cleaned['source_id'] for _, cleaned in rows if cleaned['source_id']]
+        return set(
+            ImportedRow.objects.filter(job=self.job, kind=kind, source_id__in=source_ids)
+            .values_list('source_id', flat=True)
+        )
+
+    def record_source_ids(self, kind, pairs):
+        ImportedRow.objects.bulk_create([
+            ImportedRow(job=self.job, kind=kind, source_id=cleaned['source_id'], object_id=obj.pk)
+            for cleaned, obj in pairs if cleaned['source_id']
+        ])
+
+    def drop_duplicate_ids(self, kind, rows, errors):
+        known = self.known_source_ids(kind, rows)
+        kept = []
+        for line_number, cleaned in rows:
+            source_id = cleaned['source_id']
+            if source_id and source_id in known:
+                errors.append((line_number, [f"Duplicate id '{source_id}'."]))
+                continue
+            if source_id:
+                known.add(source_id)
+            kept.append((line_number, cleaned))
+        return kept
+
+    # --- Chunk writers: each returns (rows_created, [(line_number, [messages])]) ---
+
+    def write_customers(self, rows):
+        errors = []
+        rows = self.drop_duplicate_ids('customers', rows, errors)
+        existing = set(
+            Customer.objects.filter(email__in=[cleaned['email'] for _, cleaned in rows])
+            .values_list('email', flat=True)
+        )
+        pairs = []
+        for line_number, cleaned in rows:
+            if cleaned['email'] in existing:
+                errors.append((line_number, [f"Email already exists: {cleaned['email']}."]))
+                continue
+            existing.add(cleaned['email'])
+            pairs.append((cleaned, Customer(name=cleaned['name'], email=cleaned['email'], phone=cleaned['phone'])))
+
+        Customer.objects.bulk_create([obj for _, obj in pairs])
+        self.record_source_ids('customers', pairs)
+        return len(pairs), errors
+
+    def write_products(self, rows):
+        errors = []
+        rows = self.drop_duplicate_ids('products', rows, errors)
+        pairs = [
+            (cleaned, Product(
+                name=cleaned['name'], description=cleaned['description'],
+                price=cleaned['price'], stock=cleaned['stock'],
+            ))
+            for _, cleaned in rows
+        ]
+        Product.objects.bulk_create([obj for _, obj in pairs])
+        self.record_source_ids('products', pairs)
+        return len(pairs), errors
+
+    def write_orders(self, rows):
+        errors = []
+        emails = [cleaned['customer_ref'][1] for _, cleaned in rows if cleaned['customer_ref'][0] == 'email']
+        customers_by_email = dict(Customer.objects.filter(email__in=emails).values_list('email', 'id'))
+
+        resolved = []
+        for line_number, cleaned in rows:
+            ref_type, ref = cleaned['customer_ref']
+            id_map = self.customer_ids if ref_type == 'id' else customers_by_email
+            customer_id = id_map.get(ref)
+            product_ids = [self.product_ids.get(p) for p in cleaned['product_ids']]
+            row_errors = []
+            if customer_id is None:
+                row_errors.append(f"Customer {ref_type} '{ref}' not found.")
+            row_errors.extend(
+                f"Product ID '{p}' not found." for p, pk in zip(cleaned['product_ids'], product_ids) if pk is None
+            )
+            if row_errors:
+                errors.append((line_number, row_errors))
+                continue
+            resolved.append((cleaned, customer_id, list(dict.fromkeys(product_ids))))
+
+        prices = dict(
+            Product.objects.filter(pk__in={pk for _, _, pks in resolved for pk in pks}).values_list('id', 'price')
+        )
+        orders = []
+        for cleaned, customer_id, product_ids in resolved:
+            order_date = cleaned['order_date'] or timezone.now()
+            if timezone.is_naive(order_date):
+                order_date = timezone.make_aware(order_date)
+            total_amount = cleaned['total_amount']
+            if total_amount is None:
+                total_amount = sum((prices[pk] for pk in product_ids), Decimal('0.00'))
+            orders.append(Order(customer_id=customer_id, order_date=order_date, total_amount=total_amount))
+
+        Order.objects.bulk_create(orders)
+        Through = Order.products.through
+        Through.objects.bulk_create([
+            Through(order_id=order.pk, product_id=product_id)
+            for order, (_, _, product_ids) in zip(orders, resolved)
+            for product_id in product_ids
+        ])
+        return len(orders), errors
@@ -0,0 +1,24 @@
+# crm/management/commands/refresh_stock.py
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import inventory
+from crm.models import StockShard
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes Product.stock from the stock shards for every sharded product. "
+        "Run it periodically (e.g. from cron) to pick up refreshes a worker left pending when it exited."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        product_pks = list(StockShard.objects.values_list('product_id', flat=True).distinct().order_by('product_id'))
+        updated = 0
+        for i in range(0, len(product_pks), options['batch_size']):
+            updated += inventory.refresh_stock(product_pks[i:i + options['batch_size']])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed stock for {updated} products."))
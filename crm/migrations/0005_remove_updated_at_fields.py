@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_order_archive'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='customer',
+            name='updated_at',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='updated_at',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='updated_at',
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='phone',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
@@ -1,8 +1,16 @@
 # alx-backend-graphql_crm/crm/models.py
 
-from django.db import models
+from django.db import models, transaction
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+from .validators import is_valid_phone
+
+def validate_phone_number(value):
+    # Referenced by migration 0001
+    if value and not is_valid_phone(value):
+        raise ValidationError(f"Invalid phone number format: {value}.")
+
 class Customer(models.Model):
     name = models.CharField(max_length=255)
     email = models.EmailField(unique=True)
@@ -16,16 +24,31 @@ class Product(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Materialized sum of the product's StockShard rows, refreshed by crm.inventory.
+    # The initial value seeds the shards; saving a new value resets the shards to it
+    # (see crm.signals), while orders and restocks go through crm.inventory.
     stock = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Atomic so the post_save handler's shard update commits or rolls back with the row
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so crm.signals can tell whether a save actually changed stock
+        instance._loaded_stock = instance.stock if 'stock' in field_names else None
+        return instance
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, related_name='orders', on_delete=models.CASCADE)
     products = models.ManyToManyField(Product, related_name='orders')
-    order_date = models.DateTimeField(default=timezone.now)
+    order_date = models.DateTimeField(default=timezone.now, db_index=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -38,4 +61,82 @@ class Order(models.Model):
              super().save(*args, **kwargs) # Save first to get a PK for M2M relationship
              if self.products.exists():
                 self.total_amount = sum(product.price for product in self.products.all())
-        super().save(*args, **kwargs) # Save again with the total amount
\ No newline at end of file
+             kwargs.pop('force_insert', None) # objects.create() passes it; the row now exists
+        super().save(*args, **kwargs) # Save again with the total amount
+
+class StockShard(models.Model):
+    # One slice of a product's stock; orders decrement a single shard so they
+    # do not all queue on the same row lock
+    product = models.ForeignKey(Product, related_name='stock_shards', on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'shard')
+
+    def __str__(self):
+        return f"{self.product_id}#{self.shard}: {self.quantity}"
+
+class StockReservation(models.Model):
+    HELD = 'held'
+    COMMITTED = 'committed'
+    RELEASED = 'released'
+    STATUS_CHOICES = [
+        (HELD, 'Held'),
+        (COMMITTED, 'Committed'),
+        (RELEASED, 'Released'),
+    ]
+
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    shard = models.ForeignKey(StockShard, related_name='reservations', on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, related_name='reservations', null=True, blank=True, on_delete=models.SET_NULL)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=HELD)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x product {self.product_id} ({self.status})"
+
+class ArchivedOrder(models.Model):
+    # Cold copy of an Order moved out by crm.archive; keeps the original id so
+    # Relay IDs stay valid. Fields mirror Order so OrderFilter works on both.
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, related_name='archived_orders', on_delete=models.CASCADE)
+    products = models.ManyToManyField(Product, related_name='archived_orders')
+    order_date = models.DateTimeField(db_index=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    created_at = models.DateTimeField() # Copied from the hot row, so no auto_now_add
+
+    def __str__(self):
+        return f"Archived order {self.id}"
+
+class ArchiveWatermark(models.Model):
+    # Every archived row is dated before `before`; queries starting at or after it only need the hot table
+    name = models.CharField(max_length=50, unique=True)
+    before = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} archived before {self.before}"
+
+class ImportCheckpoint(models.Model):
+    # Progress of a `manage.py import_crm` job, committed together with each chunk
+    job = models.CharField(max_length=100)
+    kind = models.CharField(max_length=20)
+    rows_done = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('job', 'kind')
+
+    def __str__(self):
+        return f"{self.job}/{self.kind}: {self.rows_done} rows"
+
+class ImportedRow(models.Model):
+    # Maps a source file id to the created row so orders can resolve it after a resume
+    job = models.CharField(max_length=100)
+    kind = models.CharField(max_length=20)
+    source_id = models.CharField(max_length=255)
+    object_id = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ('job', 'kind', 'source_id')
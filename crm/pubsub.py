@@ -0,0 +1,104 @@
+# crm/pubsub.py
+# Publish/subscribe layer feeding the GraphQL subscriptions.
+#
+# Events are published from synchronous Django code (mutations, signal
+# handlers) and consumed by async websocket subscriptions. The backend is
+# chosen with the CRM_PUBSUB_BACKEND setting, so the in-process broker can be
+# replaced by e.g. a Redis-backed one when running several workers. A backend
+# must provide:
+#   publish(channel, event)                -- callable from any thread
+#   subscribe(channel, predicate=None)     -- async iterator of matching events
+#
+# Events are plain dicts built in synchronous code (crm.inventory, crm.signals,
+# the mutations), so the async subscription side never has to touch the ORM.
+import asyncio
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+STOCK_CHANNEL = 'product.stock'
+ORDER_CHANNEL = 'order.created'
+
+DEFAULT_BACKEND = 'crm.pubsub.InProcessBroker'
+
+
+def stock_event(product_id, name, stock, previous_stock=None):
+    return {'product_id': product_id, 'name': name, 'stock': stock, 'previous_stock': previous_stock}
+
+def order_event(order):
+    return {
+        'order_id': order.pk,
+        'customer_id': order.customer_id,
+        'customer_name': order.customer.name,
+        'total_amount': order.total_amount,
+        'order_date': order.order_date,
+        'product_ids': list(order.products.values_list('id', flat=True)),
+    }
+
+def publish_on_commit(channel, events):
+    # Only committed changes are announced; a rolled back order publishes nothing.
+    # robust: the change is already committed, so a failing broker is logged
+    # instead of turning a successful mutation into an error.
+    def publish():
+        broker = get_broker()
+        for event in events:
+            broker.publish(channel, event)
+    transaction.on_commit(publish, robust=True)
+
+
+class _Subscriber:
+    def __init__(self, loop, predicate, max_queue):
+        self.loop = loop
+        self.predicate = predicate
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def deliver(self, event):
+        # Filters run on the publishing side so non-matching events never reach the client's queue
+        if self.predicate is not None and not self.predicate(event):
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass # Event loop already closed; the subscription is going away
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait() # Slow consumer: drop the oldest event rather than grow without bound
+        self.queue.put_nowait(event)
+
+
+class InProcessBroker:
+    """
+    Broadcasts events to subscribers living in this process only.
+    """
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.deliver(event)
+
+    async def subscribe(self, channel, predicate=None):
+        subscriber = _Subscriber(asyncio.get_running_loop(), predicate, self.max_queue)
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            while True:
+                yield await subscriber.queue.get()
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    backend = getattr(settings, 'CRM_PUBSUB_BACKEND', DEFAULT_BACKEND)
+    return import_string(backend)()
@@ -1,20 +1,49 @@
 import graphene
 from graphene_django import DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField # Task 3: Import for filtering
-from .models import Customer, Product, Order
+from .models import Customer, Product, Order, ArchivedOrder
 from .filters import CustomerFilter, ProductFilter, OrderFilter # Task 3: Import your filter classes
-import re
+from .validators import is_valid_phone, validate_product_fields # Shared with the import_crm command
+from . import inventory
+from .pubsub import STOCK_CHANNEL, ORDER_CHANNEL, get_broker
 from django.db import transaction #, IntegrityError # IntegrityError not directly used in this snippet
 from django.utils import timezone
+from graphql import GraphQLError
+from graphql_relay import from_global_id, to_global_id
+from collections import Counter
 from decimal import Decimal
-
-from crm import models
+from functools import partial
 
 # Unused import 'from crm import models' removed as models are already imported from .models
 
 # --- Graphene Object Types (representing Django models) ---
+class OrderConnectionField(DjangoFilterConnectionField):
+    """
+    Order connection that also searches archived orders (see crm/archive.py).
+    `archived(parent)` returns the archived orders in the same scope as the
+    field's hot orders; the default, for root fields, is the whole archive.
+    """
+    def __init__(self, type_, archived=None, **kwargs):
+        self.archived = archived or (lambda parent: ArchivedOrder.objects.all())
+        super().__init__(type_, **kwargs)
+
+    def wrap_resolve(self, parent_resolver):
+        def resolve(root, info, **args):
+            # Built per call so OrderFilter gets the archived orders of this parent
+            queryset_resolver = partial(
+                self.resolve_queryset, filtering_args=self.filtering_args,
+                filterset_class=partial(self.filterset_class, archived=self.archived(root)),
+            )
+            return self.connection_resolver(
+                self.resolver or parent_resolver, self.connection_type, self.get_manager(), queryset_resolver,
+                self.max_limit, self.enforce_first_or_last, root, info, **args,
+            )
+        return resolve
+
 # Task 3: Changed to XxxNode and implementing graphene.relay.Node for DjangoFilterConnectionField
 class CustomerNode(DjangoObjectType):
+    orders = OrderConnectionField(lambda: OrderNode, archived=lambda customer: customer.archived_orders.all())
+
     class Meta:
         model = Customer
         fields = ("id", "name", "email", "phone", "created_at", "orders")
@@ -22,6 +51,9 @@ class CustomerNode(DjangoObjectType):
         interfaces = (graphene.relay.Node,)
 
 class ProductNode(DjangoObjectType):
+    # stock is the materialized sum of the product's stock shards (see crm/inventory.py)
+    orders = OrderConnectionField(lambda: OrderNode, archived=lambda product: product.archived_orders.all())
+
     class Meta:
         model = Product
         fields = ("id", "name", "price", "stock", "created_at", "orders")
@@ -51,10 +83,14 @@ class OrderNode(DjangoObjectType):
     # Required for Node interface if you want to customize how nodes are fetched by global ID
     @classmethod
     def get_node(cls, info, id):
-        try:
-            return cls._meta.model.objects.get(pk=id)
-        except cls._meta.model.DoesNotExist:
-            return None
+        # Archived orders keep their id, so fall back to the archive
+        order = cls._meta.model.objects.filter(pk=id).first()
+        return order or ArchivedOrder.objects.filter(pk=id).first()
+
+    @classmethod
+    def is_type_of(cls, root, info):
+        # allOrders may return archived rows (see crm/archive.py); they resolve as OrderNode too
+        return isinstance(root, ArchivedOrder) or super().is_type_of(root, info)
 
 # --- Input Object Types for Mutations (from your provided code) ---
 class CustomerInput(graphene.InputObjectType):
@@ -72,11 +108,6 @@ class OrderInput(graphene.InputObjectType):
     product_ids = graphene.List(graphene.ID, required=True)
     order_date = graphene.Date()
 
-# --- Helper for Phone Validation (from your provided code) ---
-def is_valid_phone(phone_number):
-    phone_pattern = re.compile(r"^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$")
-    return bool(phone_pattern.match(phone_number))
-
 # --- Mutation Classes (from your provided code) ---
 # Task 3 Note: Ensure the output fields of mutations (e.g., customer, product, order)
 # use the Node types (CustomerNode, ProductNode, OrderNode) if you want full consistency
@@ -140,11 +171,7 @@ class CreateProduct(graphene.Mutation):
     errors = graphene.List(graphene.String)
 
     def mutate(self, info, input):
-        validation_errors = []
-        if input.price <= Decimal('0'):
-            validation_errors.append("Price must be positive.")
-        if input.stock < 0:
-            validation_errors.append("Stock cannot be negative.")
+        validation_errors = validate_product_fields(input.price, input.stock)
         if validation_errors:
             return CreateProduct(product=None, errors=validation_errors)
         try:
@@ -199,17 +226,21 @@ class CreateOrder(graphene.Mutation):
         if validation_errors:
             return CreateOrder(order=None, errors=validation_errors)
 
+        decrements = Counter(p.pk for p in linked_products)
         try:
-            order_instance = Order.objects.create(
-                customer=customer_instance, order_date=order_date_val, total_amount=calculated_total_amount)
-            order_instance.products.set(linked_products)
-            
-            for p in linked_products:
-                Product.objects.filter(pk=p.pk).update(stock=models.F('stock') - 1)
-
-            return CreateOrder(order=order_instance, errors=None)
+            # Savepoint: an out-of-stock product or a failed insert undoes the holds taken so far
+            with transaction.atomic():
+                reservations = [r for product_pk, count in decrements.items() for r in inventory.hold(product_pk, count)]
+                order_instance = Order.objects.create(
+                    customer=customer_instance, order_date=order_date_val, total_amount=calculated_total_amount)
+                order_instance.products.set(linked_products)
+                inventory.commit(reservations, order=order_instance)
+        except inventory.OutOfStock as e:
+            product_instance = next(p for p in linked_products if p.pk == e.product_id)
+            return CreateOrder(order=None, errors=[f"Product '{product_instance.name}' (ID: {product_instance.pk}) is out of stock."])
         except Exception as e:
             return CreateOrder(order=None, errors=[f"Failed to create order: {str(e)}"])
+        return CreateOrder(order=order_instance, errors=None)
 
 
 # --- Query Class (Updated for Task 3) ---
@@ -220,7 +251,7 @@ class Query(graphene.ObjectType):
     # Using DjangoFilterConnectionField for list queries with filtering and pagination
     all_customers = DjangoFilterConnectionField(CustomerNode)
     all_products = DjangoFilterConnectionField(ProductNode)
-    all_orders = DjangoFilterConnectionField(OrderNode)
+    all_orders = OrderConnectionField(OrderNode)
 
     # The explicit resolve_all_xxx and xxx_by_id methods are no longer needed
     # for these list fields when using DjangoFilterConnectionField.
@@ -233,4 +264,88 @@ class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
-    create_order = CreateOrder.Field()
\ No newline at end of file
+    create_order = CreateOrder.Field()
+
+
+# --- Subscriptions (served over websockets by the ASGI app) ---
+# Payloads are plain event dicts published by crm.inventory and crm.signals, so delivering an
+# event never runs ORM queries inside the event loop.
+def _pk(value):
+    # Accepts raw primary keys (as the mutations do) or Relay global IDs
+    if value is None:
+        return None
+    value = str(value)
+    if value.isdigit():
+        return int(value)
+    _, pk = from_global_id(value)
+    if not pk.isdigit():
+        raise GraphQLError(f"Invalid ID: '{value}'.")
+    return int(pk)
+
+class ProductStockEvent(graphene.ObjectType):
+    product_id = graphene.ID()
+    name = graphene.String()
+    stock = graphene.Int()
+    previous_stock = graphene.Int()
+
+    def resolve_product_id(event, info):
+        return to_global_id(ProductNode._meta.name, event['product_id'])
+
+class OrderCreatedEvent(graphene.ObjectType):
+    order_id = graphene.ID()
+    customer_id = graphene.ID()
+    customer_name = graphene.String()
+    total_amount = graphene.Decimal()
+    order_date = graphene.DateTime()
+    product_ids = graphene.List(graphene.ID)
+
+    def resolve_order_id(event, info):
+        return to_global_id(OrderNode._meta.name, event['order_id'])
+
+    def resolve_customer_id(event, info):
+        return to_global_id(CustomerNode._meta.name, event['customer_id'])
+
+    def resolve_product_ids(event, info):
+        return [to_global_id(ProductNode._meta.name, pk) for pk in event['product_ids']]
+
+class Subscription(graphene.ObjectType):
+    product_stock_changed = graphene.Field(ProductStockEvent, product_id=graphene.ID(), stock_lte=graphene.Int())
+    low_stock_alert = graphene.Field(
+        ProductStockEvent, product_id=graphene.ID(), threshold=graphene.Int(default_value=10))
+    order_created = graphene.Field(
+        OrderCreatedEvent, customer_id=graphene.ID(), product_id=graphene.ID(), total_amount_gte=graphene.Decimal())
+
+    # Filter arguments become predicates evaluated by the broker before an
+    # event is queued, so each client only receives events it asked for.
+    # The resolvers below are plain functions returning the event stream, so bad
+    # arguments raise right away and reach the client as a GraphQL error.
+    def subscribe_product_stock_changed(root, info, product_id=None, stock_lte=None):
+        product_pk = _pk(product_id)
+
+        def matches(event):
+            return ((product_pk is None or event['product_id'] == product_pk)
+                    and (stock_lte is None or event['stock'] <= stock_lte))
+
+        return get_broker().subscribe(STOCK_CHANNEL, matches)
+
+    def subscribe_low_stock_alert(root, info, threshold, product_id=None):
+        product_pk = _pk(product_id)
+
+        def matches(event):
+            # Alert when stock drops below the threshold, not on every change while it stays low
+            previous = event['previous_stock']
+            return ((product_pk is None or event['product_id'] == product_pk)
+                    and event['stock'] < threshold and (previous is None or previous >= threshold))
+
+        return get_broker().subscribe(STOCK_CHANNEL, matches)
+
+    def subscribe_order_created(root, info, customer_id=None, product_id=None, total_amount_gte=None):
+        customer_pk = _pk(customer_id)
+        product_pk = _pk(product_id)
+
+        def matches(event):
+            return ((customer_pk is None or event['customer_id'] == customer_pk)
+                    and (product_pk is None or product_pk in event['product_ids'])
+                    and (total_amount_gte is None or event['total_amount'] >= total_amount_gte))
+
+        return get_broker().subscribe(ORDER_CHANNEL, matches)
@@ -0,0 +1,30 @@
+# crm/signals.py
+# Model signal handlers: keep stock shards in step with Product.stock and turn
+# new orders into pub/sub events for the GraphQL subscriptions.
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import inventory
+from .models import Product, Order
+from .pubsub import STOCK_CHANNEL, ORDER_CHANNEL, get_broker, order_event, publish_on_commit, stock_event
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        inventory.initialize_shards([instance]) # The initial stock seeds the product's shards
+        publish_on_commit(STOCK_CHANNEL, [stock_event(instance.pk, instance.name, instance.stock)])
+    elif update_fields is None or 'stock' in update_fields:
+        loaded = getattr(instance, '_loaded_stock', None) # Set by Product.from_db; None if unknown
+        if loaded != instance.stock:
+            # A direct write to stock: move the shards to the new total. Product.save runs
+            # this inside its transaction, so the row and the shards change together.
+            inventory.set_stock(instance.pk, instance.stock)
+    instance._loaded_stock = instance.stock
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    if created:
+        # Built at commit time so products added after create() (e.g. by CreateOrder) are included
+        transaction.on_commit(lambda: get_broker().publish(ORDER_CHANNEL, order_event(instance)), robust=True)
@@ -1,3 +1,416 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from graphql_relay import from_global_id, to_global_id
+
+from alx_backend_graphql_crm import schema as schema_registry
+from alx_backend_graphql_crm.schema import get_schema
+from alx_backend_graphql_crm.websocket import GraphQLWebSocketApp
+
+from . import archive, inventory
+from .management.commands.import_crm import Command as ImportCommand
+from .pubsub import ORDER_CHANNEL, STOCK_CHANNEL, get_broker
+from .models import Customer, Product, Order, ArchivedOrder, ImportCheckpoint, StockShard, StockReservation
+
+
+class ImportCrmTests(TestCase):
+    def write_file(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def run_import(self, *args, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_crm', *args, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_bad_rows_are_reported_not_fatal(self):
+        products = self.write_file('products.ndjson', '\n'.join([
+            '{"id": "1", "name": "Good", "price": "9.99", "stock": 3}',
+            '{"id": "2", "name": "NaN price", "price": "NaN", "stock": 1}',
+            '{"id": "3", "name": "Too big", "price": "12345678901.00", "stock": 1}',
+            '{"id": "4", "name": "Too precise", "price": "1.005", "stock": 1}',
+            '{not json',
+            '{"id": "5", "name": "Negative", "price": "-1", "stock": -2}',
+        ]))
+        customers = self.write_file('customers.csv', (
+            'id,name,email,phone\n'
+            'c1,Alice,alice@example.com,+12223334444\n'
+            'c2,Bob,bob@example.com,not-a-phone\n'
+        ))
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                Product.objects.all().delete()
+                Customer.objects.all().delete()
+                _, stderr = self.run_import(customers=customers, products=products, workers=workers)
+                self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Good'])
+                self.assertEqual(list(Customer.objects.values_list('name', flat=True)), ['Alice'])
+                self.assertIn('Price must be a finite number.', stderr)
+                self.assertIn('Price must have at most 8 digits before the decimal point.', stderr)
+                self.assertIn('Price must have at most 2 decimal places.', stderr)
+                self.assertIn('Invalid JSON', stderr)
+                self.assertIn('Invalid phone number format: not-a-phone.', stderr)
+
+    def test_duplicate_ids_and_emails_are_rejected(self):
+        customers = self.write_file('customers.csv', (
+            'id,name,email,phone\n'
+            'c1,Alice,alice@example.com,\n'
+            'c1,Alice again,alice2@example.com,\n'
+            'c2,Alice clone,alice@example.com,\n'
+        ))
+        _, stderr = self.run_import(customers=customers, workers=1)
+        self.assertEqual(Customer.objects.count(), 1)
+        self.assertIn("Duplicate id 'c1'.", stderr)
+        self.assertIn('Email already exists: alice@example.com.', stderr)
+
+    def test_orders_resolve_imported_ids(self):
+        customers = self.write_file('customers.csv', 'id,name,email,phone\nc1,Alice,alice@example.com,\n')
+        products = self.write_file('products.csv', 'id,name,price,stock\np1,Pen,1.50,10\np2,Ink,2.25,10\n')
+        orders = self.write_file('orders.csv', (
+            'customer_id,customer_email,product_ids,order_date\n'
+            'c1,,p1;p2,2024-01-02\n'
+            ',alice@example.com,p2,\n'
+            'c9,,p1,\n'
+        ))
+        _, stderr = self.run_import(customers=customers, products=products, orders=orders, workers=1)
+        self.assertEqual(sorted(Order.objects.values_list('total_amount', flat=True)), [Decimal('2.25'), Decimal('3.75')])
+        self.assertIn("Customer id 'c9' not found.", stderr)
+
+    def test_resume_continues_after_failed_chunk(self):
+        rows = ''.join(f'p{i},Product {i},1.00,5\n' for i in range(10))
+        products = self.write_file('products.csv', 'id,name,price,stock\n' + rows)
+        original = ImportCommand.write_products
+        calls = []
+
+        def failing_write(command, chunk_rows):
+            calls.append(len(chunk_rows))
+            if len(calls) == 3:
+                raise RuntimeError("disk full")
+            return original(command, chunk_rows)
+
+        with mock.patch.object(ImportCommand, 'write_products', failing_write):
+            with self.assertRaises(RuntimeError):
+                self.run_import(products=products, chunk_size=3, workers=1, job='nightly')
+        # The first two chunks were committed with their checkpoint, the third rolled back
+        self.assertEqual(Product.objects.count(), 6)
+        self.assertEqual(ImportCheckpoint.objects.get(job='nightly', kind='products').rows_done, 6)
+
+        stdout, _ = self.run_import(products=products, chunk_size=3, workers=1, job='nightly', resume=True)
+        self.assertIn('resuming', stdout)
+        self.assertEqual(Product.objects.count(), 10)
+        self.assertEqual(Product.objects.filter(name='Product 0').count(), 1)
+
+
+class SocketClient:
+    """
+    Drives GraphQLWebSocketApp in memory. Its event loop only runs while the
+    test waits for something, so synchronous ORM code (mutations, on_commit
+    callbacks) runs between steps on the test's own connection.
+    """
+    def __init__(self, test):
+        self.loop = asyncio.new_event_loop()
+        self.inbox = asyncio.Queue()
+        self.sent = []
+
+        async def send(message):
+            self.sent.append(message)
+
+        scope = {'type': 'websocket', 'path': '/graphql', 'subprotocols': ['graphql-transport-ws']}
+        self.task = self.loop.create_task(GraphQLWebSocketApp(get_schema)(scope, self.inbox.get, send))
+        self.inbox.put_nowait({'type': 'websocket.connect'})
+        test.addCleanup(self.close)
+        self.send({'type': 'connection_init'})
+        self.wait_for(lambda: self.frames())
+
+    def frames(self, operation_id=None):
+        frames = [json.loads(m['text']) for m in self.sent if m['type'] == 'websocket.send']
+        return frames if operation_id is None else [f for f in frames if f.get('id') == operation_id]
+
+    def send(self, message):
+        self.inbox.put_nowait({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    def wait_for(self, condition, timeout=5):
+        async def poll():
+            while not condition():
+                await asyncio.sleep(0.001)
+        self.loop.run_until_complete(asyncio.wait_for(poll(), timeout))
+
+    def subscribe(self, operation_id, query, channel):
+        # Returns once the subscription is registered with the broker, so later events reach it
+        subscribers = get_broker()._subscribers[channel]
+        registered = len(subscribers)
+        self.send({'type': 'subscribe', 'id': operation_id, 'payload': {'query': query}})
+        self.wait_for(lambda: len(subscribers) > registered)
+
+    def close(self):
+        self.inbox.put_nowait({'type': 'websocket.disconnect'})
+        self.loop.run_until_complete(self.task)
+        # The app cancels its operations on disconnect; let them finish unwinding
+        async def unwind():
+            await asyncio.gather(*asyncio.all_tasks(self.loop) - {asyncio.current_task()}, return_exceptions=True)
+        self.loop.run_until_complete(unwind())
+        self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        self.loop.close()
+
+
+@override_settings(CRM_STOCK_REFRESH_SECONDS=0)
+class SubscriptionTests(TestCase):
+    def test_malformed_id_returns_error_frame(self):
+        socket = SocketClient(self)
+        self.assertEqual(socket.frames(), [{'type': 'connection_ack'}])
+        socket.send({'type': 'subscribe', 'id': '1', 'payload': {
+            'query': 'subscription { productStockChanged(productId: "not-an-id") { stock } }'}})
+        socket.wait_for(lambda: socket.frames('1'))
+        frame, = socket.frames('1')
+        self.assertEqual(frame['type'], 'error')
+        self.assertIn("Invalid ID: 'not-an-id'.", frame['payload'][0]['message'])
+
+    def test_create_order_reaches_matching_subscriptions(self):
+        alice = Customer.objects.create(name='Alice', email='alice@example.com')
+        bob = Customer.objects.create(name='Bob', email='bob@example.com')
+        pen = Product.objects.create(name='Pen', price=Decimal('1.00'), stock=10)
+        ink = Product.objects.create(name='Ink', price=Decimal('2.00'), stock=50)
+
+        socket = SocketClient(self)
+        subscriptions = {
+            'alice': ('orderCreated(customerId: "%s") { customerName totalAmount }' % alice.pk, ORDER_CHANNEL),
+            'bob': ('orderCreated(customerId: "%s") { customerName }' % bob.pk, ORDER_CHANNEL),
+            'pen-low': ('productStockChanged(productId: "%s", stockLte: 9) { name stock previousStock }' % pen.pk,
+                        STOCK_CHANNEL),
+            'very-low': ('productStockChanged(stockLte: 5) { name stock }', STOCK_CHANNEL),
+            'alert': ('lowStockAlert(threshold: 10) { name stock }', STOCK_CHANNEL),
+        }
+        for operation_id, (field, channel) in subscriptions.items():
+            socket.subscribe(operation_id, 'subscription { %s }' % field, channel)
+
+        mutation = 'mutation { createOrder(input: {customerId: "%s", productIds: ["%s", "%s"]}) { errors } }'
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                result = get_schema().execute(mutation % (alice.pk, pen.pk, ink.pk))
+            self.assertIsNone(result.errors)
+            self.assertIsNone(result.data['createOrder']['errors'])
+        socket.wait_for(lambda: len(socket.frames('alice')) == 2 and len(socket.frames('pen-low')) == 2)
+
+        payloads = lambda operation_id: [f['payload']['data'] for f in socket.frames(operation_id)]
+        self.assertEqual(payloads('alice'), [{'orderCreated': {'customerName': 'Alice', 'totalAmount': '3.00'}}] * 2)
+        self.assertEqual(payloads('pen-low'), [
+            {'productStockChanged': {'name': 'Pen', 'stock': 9, 'previousStock': 10}},
+            {'productStockChanged': {'name': 'Pen', 'stock': 8, 'previousStock': 9}},
+        ])
+        # Only the first order takes Pen below the threshold; Ink never gets there
+        self.assertEqual(payloads('alert'), [{'lowStockAlert': {'name': 'Pen', 'stock': 9}}])
+        self.assertEqual(socket.frames('bob'), [])
+        self.assertEqual(socket.frames('very-low'), [])
+
+    def test_broker_failure_does_not_fail_the_order(self):
+        alice = Customer.objects.create(name='Alice', email='alice@example.com')
+        pen = Product.objects.create(name='Pen', price=Decimal('1.00'), stock=10)
+        mutation = 'mutation { createOrder(input: {customerId: "%s", productIds: ["%s"]}) { errors } }'
+        with mock.patch.object(get_broker(), 'publish', side_effect=ConnectionError("broker down")), \
+                self.assertLogs('django', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                result = get_schema().execute(mutation % (alice.pk, pen.pk))
+        self.assertIsNone(result.errors)
+        self.assertIsNone(result.data['createOrder']['errors'])
+        self.assertEqual(Order.objects.count(), 1)
+
+
+@override_settings(CRM_STOCK_REFRESH_SECONDS=0)
+class ProductStockSignalTests(TestCase):
+    def saved_events(self, save):
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                save()
+        return [c.args[1] for c in publish.call_args_list]
+
+    def test_only_stock_changes_are_published(self):
+        Product.objects.create(name='Lamp', price=Decimal('5.00'), stock=3)
+        product = Product.objects.get(name='Lamp')
+
+        product.name = 'Desk lamp'
+        self.assertEqual(self.saved_events(product.save), [])
+
+        product.stock = 2
+        events = self.saved_events(product.save)
+        self.assertEqual([(e['stock'], e['previous_stock']) for e in events], [(2, 3)])
+
+
+    def test_saving_stock_moves_the_shards(self):
+        Product.objects.create(name='Lamp', price=Decimal('5.00'), stock=10)
+        product = Product.objects.get(name='Lamp')
+        product.stock = 50
+        events = self.saved_events(product.save)
+        self.assertEqual([(e['stock'], e['previous_stock']) for e in events], [(50, 10)])
+
+        events = self.saved_events(lambda: inventory.hold(product.pk, 1))
+        self.assertEqual([(e['stock'], e['previous_stock']) for e in events], [(49, 50)])
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 49)
+        self.assertEqual(inventory.stock_levels([product.pk]), {product.pk: 49})
+
+    def test_release_and_restock_are_published(self):
+        product = Product.objects.create(name='Lamp', price=Decimal('5.00'), stock=10)
+        held = inventory.hold(product.pk, 3)
+        events = self.saved_events(lambda: inventory.release(held))
+        events += self.saved_events(lambda: inventory.restock(product.pk, 5))
+        events += self.saved_events(lambda: inventory.reshard(product.pk, 2))
+        self.assertEqual([(e['stock'], e['previous_stock']) for e in events], [(10, 7), (15, 10)])
+
+@override_settings(CRM_STOCK_SHARDS=4, CRM_STOCK_REFRESH_SECONDS=0)
+class InventoryTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Pen', price=Decimal('1.00'), stock=10)
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_hold_commit_and_release(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            held = inventory.hold(self.product.pk, 3)
+        self.assertEqual(sum(r.quantity for r in held), 3)
+        self.assertEqual(self.stock(), 7)
+
+        customer = Customer.objects.create(name='Alice', email='alice@example.com')
+        order = Order.objects.create(customer=customer, total_amount=Decimal('3.00'))
+        self.assertEqual(inventory.commit(held, order=order), len(held))
+        self.assertEqual(inventory.release(held), 0) # Committed stock is not handed back
+
+        with self.captureOnCommitCallbacks(execute=True):
+            held = inventory.hold(self.product.pk, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(inventory.release(held), len(held))
+        self.assertEqual(self.stock(), 7)
+        self.assertEqual(set(StockReservation.objects.values_list('status', flat=True)),
+                         {StockReservation.COMMITTED, StockReservation.RELEASED})
+
+    def test_out_of_stock_leaves_shards_untouched(self):
+        with self.assertRaises(inventory.OutOfStock):
+            inventory.hold(self.product.pk, 11)
+        self.assertEqual(inventory.stock_levels([self.product.pk]), {self.product.pk: 10})
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_shards_are_seeded_lazily(self):
+        # bulk_create skips post_save, so these products have no shards yet
+        product = Product.objects.bulk_create([Product(name='Ink', price=Decimal('2.00'), stock=5)])[0]
+        self.assertFalse(StockShard.objects.filter(product=product).exists())
+        inventory.hold(product.pk, 2)
+        self.assertEqual(StockShard.objects.filter(product=product).count(), 4)
+        self.assertEqual(inventory.stock_levels([product.pk]), {product.pk: 3})
+
+    @override_settings(CRM_STOCK_REFRESH_SECONDS=60)
+    def test_refreshes_are_coalesced(self):
+        with mock.patch('crm.inventory.threading.Timer') as timer, \
+                mock.patch('crm.inventory.refresh_stock', wraps=inventory.refresh_stock) as refresh:
+            for _ in range(3):
+                with self.captureOnCommitCallbacks(execute=True):
+                    inventory.hold(self.product.pk)
+            self.assertEqual(timer.call_count, 1)
+            refresh.assert_not_called()
+            self.assertEqual(self.stock(), 10) # Still the old value until the timer fires
+
+            self.assertEqual(inventory.flush_refreshes(), 1)
+            refresh.assert_called_once_with([self.product.pk])
+        self.assertEqual(self.stock(), 7)
+
+
+class IntrospectionCacheTests(TestCase):
+    def post(self, query):
+        response = self.client.post('/graphql', {'query': query}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_introspection_is_served_from_cache(self):
+        schema_registry.execute_introspection.cache_clear()
+        query = '{ __schema { queryType { name } } }'
+        first, second = self.post(query), self.post(query)
+        self.assertEqual(first, second)
+        self.assertEqual(first['data']['__schema']['queryType']['name'], 'Query')
+        info = schema_registry.execute_introspection.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 1))
+
+    def test_ordinary_queries_skip_the_cache(self):
+        schema_registry.execute_introspection.cache_clear()
+        Product.objects.create(name='Pen', price=Decimal('1.00'), stock=1)
+        mixed = '{ __schema { queryType { name } } allProducts { edges { node { name } } } }'
+        self.assertEqual(self.post(mixed)['data']['allProducts']['edges'], [{'node': {'name': 'Pen'}}])
+        self.assertEqual(schema_registry.execute_introspection.cache_info().currsize, 0)
+
+        with mock.patch.object(schema_registry, 'parse', wraps=schema_registry.parse) as parse:
+            self.assertEqual(self.post('{ __typename hello }')['data'], {'__typename': 'Query', 'hello': 'Hello, GraphQL!'})
+        parse.assert_not_called() # __typename alone must not cost an extra parse
+        self.assertTrue(schema_registry.is_introspection_query('{ __type(name: "Query") { name } }'))
+
+
+@override_settings(CRM_ARCHIVE_WATERMARK_SECONDS=0)
+class OrderArchiveTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.alice = Customer.objects.create(name='Alice', email='alice@example.com')
+        self.bob = Customer.objects.create(name='Bob', email='bob@example.com')
+        self.pen = Product.objects.create(name='Pen', price=Decimal('1.00'), stock=100)
+        self.ink = Product.objects.create(name='Ink', price=Decimal('2.00'), stock=100)
+        for i in range(12):
+            order = Order.objects.create(
+                customer=self.alice if i % 2 else self.bob,
+                order_date=now - timedelta(days=100 * i), total_amount=Decimal(i % 4),
+            )
+            order.products.add(self.pen if i % 3 else self.ink)
+        cutoff = now - timedelta(days=365)
+        archive.advance_watermark(cutoff)
+        archive.archive_batch(cutoff, 100)
+
+    def order_ids(self, data):
+        return [int(from_global_id(edge['node']['id'])[1]) for edge in data['edges']]
+
+    def execute(self, query):
+        result = get_schema().execute(query)
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def test_archived_orders_are_routed_by_scope(self):
+        self.assertEqual(ArchivedOrder.objects.count(), 8)
+        everything = self.execute('{ allOrders(orderDateLte: "2100-01-01") { edges { node { id } } } }')
+        self.assertEqual(len(everything['allOrders']['edges']), 12)
+
+        customer = self.execute('{ node(id: "%s") { ... on CustomerNode { orders(orderDateLte: "2100-01-01") { edges { node { id } } } } } }'
+                                % to_global_id('CustomerNode', self.alice.pk))
+        expected = sorted(list(self.alice.orders.values_list('pk', flat=True)) + list(self.alice.archived_orders.values_list('pk', flat=True)))
+        self.assertEqual(sorted(self.order_ids(customer['node']['orders'])), expected)
+
+        product = self.execute('{ node(id: "%s") { ... on ProductNode { orders(orderDateLte: "2100-01-01") { edges { node { id } } } } } }'
+                               % to_global_id('ProductNode', self.ink.pk))
+        expected = sorted(list(self.ink.orders.values_list('pk', flat=True)) + list(self.ink.archived_orders.values_list('pk', flat=True)))
+        self.assertEqual(sorted(self.order_ids(product['node']['orders'])), expected)
+
+    def test_merged_ordering_and_slices(self):
+        all_ids = sorted(list(Order.objects.values_list('pk', flat=True)) + list(ArchivedOrder.objects.values_list('pk', flat=True)))
+        data = self.execute('{ allOrders(orderDateLte: "2100-01-01", orderBy: "-id") { edges { node { id } } } }')
+        self.assertEqual(self.order_ids(data['allOrders']), all_ids[::-1])
+
+        data = self.execute('{ allOrders(orderDateLte: "2100-01-01", orderBy: "-customer_name") { edges { node { id } } } }')
+        by_name = sorted(all_ids, key=lambda pk: (Customer.objects.get(
+            pk=(Order.objects.filter(pk=pk).first() or ArchivedOrder.objects.get(pk=pk)).customer_id).name, -pk), reverse=True)
+        self.assertEqual(self.order_ids(data['allOrders']), by_name)
+
+        merged = archive.MergedOrders(Order.objects.order_by('total_amount'), ArchivedOrder.objects.all())
+        expected = [o.pk for o in sorted(list(Order.objects.all()) + list(ArchivedOrder.objects.all()),
+                                         key=lambda o: (o.total_amount, o.pk))]
+        for start in range(len(expected) + 1):
+            for stop in (start + 1, start + 3, None):
+                with self.subTest(start=start, stop=stop):
+                    self.assertEqual([o.pk for o in merged[start:stop]], expected[start:stop])
@@ -0,0 +1,39 @@
+# crm/validators.py
+# Validation rules shared by the GraphQL mutations and the bulk importer.
+# Kept free of Django model imports so they can run in worker processes.
+import re
+from decimal import Decimal, ROUND_DOWN
+
+PHONE_PATTERN = re.compile(r"^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$")
+
+
+def is_valid_phone(phone_number):
+    return bool(PHONE_PATTERN.match(phone_number))
+
+
+# Product.price and Order.total_amount are DecimalField(max_digits=10, decimal_places=2)
+MAX_DIGITS = 10
+DECIMAL_PLACES = 2
+
+
+def validate_amount(value, label):
+    # Values the database column cannot hold come back as messages instead of
+    # raising later (NaN comparisons raise InvalidOperation, oversized values break reads)
+    if not value.is_finite():
+        return [f"{label} must be a finite number."]
+    if abs(value) >= Decimal(10) ** (MAX_DIGITS - DECIMAL_PLACES):
+        # Checked before quantize(), which raises for very large values
+        return [f"{label} must have at most {MAX_DIGITS - DECIMAL_PLACES} digits before the decimal point."]
+    if value != value.quantize(Decimal(1).scaleb(-DECIMAL_PLACES), rounding=ROUND_DOWN):
+        return [f"{label} must have at most {DECIMAL_PLACES} decimal places."]
+    return []
+
+
+def validate_product_fields(price, stock):
+    # Same checks CreateProduct has always applied; returns a list of messages
+    errors = validate_amount(price, "Price")
+    if not errors and price <= Decimal('0'):
+        errors.append("Price must be positive.")
+    if stock < 0:
+        errors.append("Stock cannot be negative.")
+    return errors